@@ -1,9 +1,40 @@
 import json
 import os
-from typing import Dict, Any, Optional
+import pickle
+from typing import Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 from pathlib import Path
 
+# Prefer a C-extension JSON backend when one is installed: orjson, then ujson, then stdlib json
+try:
+    import orjson
+
+    _JSONDecodeError = orjson.JSONDecodeError
+
+    def _json_loads(data: bytes) -> Any:
+        return orjson.loads(data)
+
+    def _json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+except ImportError:
+    try:
+        import ujson as _json_backend
+    except ImportError:
+        _json_backend = json
+
+    _JSONDecodeError = getattr(_json_backend, "JSONDecodeError", ValueError)
+
+    def _json_loads(data: bytes) -> Any:
+        return _json_backend.loads(data)
+
+    def _json_dumps(obj: Any) -> bytes:
+        return _json_backend.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+# On-disk cache of the parsed config file, keyed by (resolved path, mtime_ns, size)
+_CACHE_FILE = Path.home() / ".cache" / "docgen" / "config.pkl"
+
 
 @dataclass
 class Config:
@@ -17,6 +48,8 @@ class Config:
     max_iterations: int
     score: int
     input_customer_profile_file: str
+    max_workers: int = 8
+    max_llm_input_chars: int = 100000
 
 
 def __post_init__(self):
@@ -39,13 +72,20 @@ class ConfigParser:
             config file_path: configuration file path, default is config.json
         """    
         self.config_file_path = Path(config_file_path)
+        self._resolved_path = str(self.config_file_path.resolve())
         self._config_data: Optional[Dict[str, Any]] = None
         self._config: Optional[Config] = None
+        self._cache_key: Optional[Tuple[str, int, int]] = None
+        # Config whose values were last exported by set_environment_variables
+        self._env_config: Optional[Config] = None
 
     def load(self)-> Config:
         """
         Load and parse configuration file
 
+        The parsed result is cached in memory and on disk (see _CACHE_FILE),
+        and the file is only re-parsed when its modification time or size changes.
+
         Returns:
             Config object
             
@@ -55,19 +95,28 @@ class ConfigParser:
             KeyError: Missing required configuration items
             ValueError: Inyalid configuration values
         """   
-        if not self.config_file_path.exists():
-            raise FileNotFoundError(f"config file not found; {self.config_file_path}")
-                                    
         try:
-            with open(self.config_file_path, 'r', encoding='utf-8') as f:
-                self._config_data = json.load(f)
-        except json.JSoNDecodeError as e:
-            raise json.JSONDecodeError(
-                f"Invalid JsoN format in {self.config_file_path}: {str(e)}",
-                e.doc,
-                e.pos
-            )
-        
+            st = self.config_file_path.stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"config file not found; {self.config_file_path}") from None
+        cache_key = (self._resolved_path, st.st_mtime_ns, st.st_size)
+        if self._config is not None and cache_key == self._cache_key:
+            return self._config
+
+        config_data = self._read_cache(cache_key)
+        from_cache = config_data is not None
+        if not from_cache:
+            # Read the whole file in one call and hand the parser a single buffer
+            try:
+                config_data = _json_loads(self.config_file_path.read_bytes())
+            except (_JSONDecodeError, UnicodeDecodeError) as e:
+                raise json.JSONDecodeError(
+                    f"Invalid JSON format in {self.config_file_path}: {str(e)}",
+                    getattr(e, 'doc', ''),
+                    getattr(e, 'pos', 0)
+                )
+        self._config_data = config_data
+
         # Validate required configuration items
         required_keys = [
             "OPENAI_API_BASE",
@@ -86,6 +135,10 @@ class ConfigParser:
         if missing_keys:
             raise KeyError(f"Missing required config keys: {','.join(missing_keys)}")
 
+        max_workers = int(self._config_data.get("MAX_WORKERS", 8))
+        if max_workers < 1:
+            raise ValueError("MAX_WORKERS must be greater than 0")
+
         # Create Config object
         self._config = Config(
             openai_api_base=self._config_data["OPENAI_API_BASE"],
@@ -97,11 +150,43 @@ class ConfigParser:
             llm_provider=self._config_data["LLM_PROVIDER"],
             max_iterations=int(self._config_data["MAX_ITERATIONS"]),
             score=int(self._config_data["SCORE"]),
-            input_customer_profile_file=self._config_data["INPUT_CUSTOMER_PROFILE_FILE"]
+            input_customer_profile_file=self._config_data["INPUT_CUSTOMER_PROFILE_FILE"],
+            max_workers=max_workers,
+            max_llm_input_chars=int(self._config_data.get("MAX_LLM_INPUT_CHARS", 100000))
         )
+        self._cache_key = cache_key
+        if not from_cache:
+            self._write_cache(cache_key)
 
         return self._config
 
+    def _read_cache(self, cache_key: Tuple[str, int, int]) -> Optional[Dict[str, Any]]:
+        """Return the cached config data if it was parsed from the same file version, otherwise None"""
+        try:
+            with open(_CACHE_FILE, 'rb') as f:
+                cached_key, config_data = pickle.load(f)
+        except Exception:
+            # Missing, unreadable or outdated cache: fall back to parsing the config file
+            return None
+        return config_data if cached_key == cache_key else None
+
+    def _write_cache(self, cache_key: Tuple[str, int, int]) -> None:
+        """Save the parsed config data to the on-disk cache (best effort)"""
+        try:
+            _CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = _CACHE_FILE.with_suffix(f".{os.getpid()}.tmp")
+            # The config holds API keys, so keep the cache readable by the owner only
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((cache_key, self._config_data), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, _CACHE_FILE)
+        except OSError as e:
+            print(f"Warning; could not write config cache {_CACHE_FILE}: {e}")
+
+    def _ensure_loaded(self) -> Config:
+        """Load the configuration if not loaded yet or if the file has changed since"""
+        return self.load()
+
     def get(self, key: str, default: Any = None)-> Any:
         """
         Get the value of specified configuration item
@@ -113,8 +198,7 @@ class ConfigParser:
         Returns:
             Value of the configuration item or default value if key does not exist    
         """
-        if self._config_data is None:
-            self.load()
+        self._ensure_loaded()
         return self._config_data.get(key, default)
 
     def get_config(self) -> Config:
@@ -124,24 +208,34 @@ class ConfigParser:
         Returns:
             Config object
         """
-        if self._config is None:
-            self.load()
-        return self._config
+        return self._ensure_loaded()
     
     def set_environment_variables(self) -> None:
         """
         Set OpenAI related configuration as environment variables
+
+        Does nothing if the current configuration has already been exported,
+        and only writes variables whose value differs.
         """
-        if self._config is None:
-            self.load()
+        config = self._ensure_loaded()
+        if self._env_config is config:
+            return
 
-        os.environ["OPENAI_API_BASE"]= self._config.openai_api_base
-        os.environ["OPENAI_API_KEY"]= self._config.openai_api_key
-        os.environ["OPENAI_MODEL"]= self._config.openai_model
-        os.environ["DOUBAO_API_ENDPOINT"]= self._config.doubao_api_endpoint
-        os.environ["DOUBAO_API_KEY"]= self._config.doubao_api_key
-        os.environ["DOUBAO_MODEL"]= self._config.doubao_model
-        print(f"Environment variables set: OPENAI API_BASE, OPENAI_API_KEY, OPENAI_MODEL, DOUBAO_API_ENDPOINT, DOUBAO_API_KEY, DOUBAO_MODEL")
+        env = {
+            "OPENAI_API_BASE": config.openai_api_base,
+            "OPENAI_API_KEY": config.openai_api_key,
+            "OPENAI_MODEL": config.openai_model,
+            "DOUBAO_API_ENDPOINT": config.doubao_api_endpoint,
+            "DOUBAO_API_KEY": config.doubao_api_key,
+            "DOUBAO_MODEL": config.doubao_model
+        }
+        changed = [key for key, value in env.items() if os.environ.get(key) != value]
+        for key in changed:
+            os.environ[key]= env[key]
+        self._env_config = config
+
+        if changed:
+            print(f"Environment variables set: {', '.join(changed)}")
 
     def validate_paths(self) -> bool:
         """ 
@@ -150,8 +244,7 @@ class ConfigParser:
         Returns:
             True if all paths are yalid, otherwise False
         """
-        if self._config is None:
-            self.load()
+        self._ensure_loaded()
 
         customer_file_path = Path(self._config.input_customer_profile_file)
         if not customer_file_path.exists():
@@ -166,17 +259,16 @@ class ConfigParser:
         Args:
             updates: Dictionary of configuration items to update
         """
-        if self. _config_data is None:
-            self.load()
+        self._ensure_loaded()
 
         self._config_data.update(updates)
 
         # Save to file
-        with open(self.config_file_path, 'w', encoding='utf-g') as f:
-            json.dump(self._config_data, f, indent=4, ensure_ascii=False)
+        self.config_file_path.write_bytes(_json_dumps(self._config_data))
 
         # Reload configuration
         self._config = None
+        self._env_config = None
         self.load()
         print(f"Config updated and saved to {self.config_file_path}")
 
@@ -197,11 +289,15 @@ def get_config() -> ConfigParser:
     """
     Get global configuration instance (singleton pattern)
 
+    The instance is loaded on first use, so later get_config() calls on it
+    reuse the cached Config instead of re-reading config.json.
+
     Returns:
         ConfigParser
     """
     global _config_instance
     if _config_instance is None:
         _config_instance = ConfigParser()
+        _config_instance.load()
     return _config_instance
 
@@ -1,28 +1,52 @@
 import requests, os
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
 
 class DoubaoLLM:
     def __init__(self, api_key=None, base_url=None, model=None):
         self.api_key = api_key or os.environ.get("DOUBAO_API_KEY")
         self.api_endpoint = base_url or os.environ.get("DOUBAO_API_ENDPOINT")
         self.model = "volcengine/" + (model or os.environ.get("DOUBAO_MODEL", "doubao-seed-1-6-250615")) # add prefix "volcengine/" to model name to be inline with litellm usage
+        self.absolute_model = self.model.split('/', 1)[-1] # model name without the litellm provider prefix, for direct api calls
 
-    def invoke(self, messages, model=None):
-        headers = {
+        # Reuse one connection pool so repeated calls skip the TCP/TLS handshake
+        self._session = requests.Session()
+        self._session.headers.update({
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
-        }
+        })
+        # Only retry requests the server never processed (connection errors, 429/503): a read
+        # timeout or gateway error may come after a generation was billed, resending would duplicate it
+        retry = Retry(
+            total=3,
+            connect=3,
+            read=0,
+            backoff_factor=0.5,
+            status_forcelist=(429, 503),
+            allowed_methods=frozenset({"POST"})
+        )
+        self._session.mount("https://", HTTPAdapter(max_retries=retry))
+        self._session.mount("http://", HTTPAdapter(max_retries=retry))
+
+    def invoke(self, messages, model=None):
         payload = {
             "model": model or self.model,
             "messages": messages
         }
         try:
-            response = requests.post(
+            response = self._session.post(
                 url=self.api_endpoint,
-                headers=headers,
-                json=payload
+                json=payload,
+                timeout=(5, 600) # reasoning models can take minutes to answer
             )
             response.raise_for_status()
-            result = response.json()
+            # Parse the raw body directly, skipping requests' text decoding
+            result = _json_loads(response.content)
             return result["choices"][0]["message"]["content"]
         except Exception as e:
             return f"Fail to invoke DOUBAO api: {str(e)}"
@@ -1,15 +1,16 @@
+import csv
 import glob
+import io
 from crewai import Agent, Task, Crew, Process
 from crewai.tools import BaseTool
 import os, re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
 
 from schema_parser import SchemaParser
 from config_parser import get_config
 
-from doubao_llm import DoubaoLLM
-from openai_llm import OpenAILLM
-
 # get config
 config = get_config()
 cfg = config.get_config()
@@ -20,50 +21,107 @@ config.set_environment_variables()
 max_iterations = cfg.max_iterations
 score_threshold = cfg.score
 customer_file = cfg.input_customer_profile_file
+max_workers = cfg.max_workers
+
+# Matches the reasoning blocks some models emit before the actual answer
+_THINK_RE = re.compile(r'<think>.*?</think>|<thinking>.*?</thinking>', re.DOTALL)
+
+# Judge output format: "Score: [1-5]" followed by "Feedback: ..."
+_SCORE_RE = re.compile(r'Score:\s*([1-5])')
+_FEEDBACK_RE = re.compile(r'Feedback:\s*(.*)', re.DOTALL)
+
+# Separator line of the iteration log, which is written as utf-8 bytes
+_LOG_RULE = b"=" * 50 + b"\n"
+
+
+def _make_llm(provider: str):
+    """Create the llm for the given provider, importing only the module it needs"""
+    if provider == "OPENAI":
+        from openai_llm import OpenAILLM
+        return OpenAILLM()
+    from doubao_llm import DoubaoLLM
+    return DoubaoLLM() # default to doubao
+
+
+llm_provider = _make_llm(cfg.llm_provider.upper())
+
+
+# Agents keep per-crew execution state, so each customer run creates its own pair
+def create_summarizer_agent() -> Agent:
+    """Create the Summarization Agent"""
+    return Agent(
+        role='Wealth Management Report Generator',
+        goal='Generate a structured, three-section output using provided customer data to assist Relationship Managers (RMs) in delivering personalized service & insights to each client through face-to-face meeting',
+        backstory="""You are an expert wealth management advisor with years of experience in:
+        - Customer profiling and behavioral analysis
+        - Investment portfolio management and optimization
+        - Market analysis and trend identification
+        You excel at creating personalized, actionable insights for Relationship Managers.
+        You are fluent in both Traditional Chinese (Cantonese tone) and British English.""",
+        verbose=True,
+        allow_delegation=False,
+        llm=llm_provider
+    )
+
+
+def create_judge_agent() -> Agent:
+    """Create the Judge Agent"""
+    return Agent(
+        role='Wealth Report Quality Assessor',
+        goal='Evaluate the quality and completeness of wealth management reports',
+        backstory="""You are a senior quality assessor specializing in wealth management reports.
+        You evaluate reports based on:
+        - Completeness of all three sections (Customer Profile, Wealth Portfolio, Market News)
+        - Accuracy and relevance of insights
+        - Professional presentation and formatting
+        - Language quality (Traditional Chinese in Cantonese tone & British English)
+        You rate reports on a scale of 1-5.""",
+        verbose=True,
+        allow_delegation=False,
+        llm=llm_provider
+    )
+
+
+def build_revision_context(customer_profile: str, market_news: str) -> str:
+    """Build the part of the report revision task that is the same for every iteration"""
+    return f"""customer profile
+================================================================
+{customer_profile}
+================================================================
+
+latest market news
+================================================================
+{market_news}
+================================================================
+
+Remember to:
+1. Maintain THREE sections: [Customer Profile], [Wealth Portfolio], [Market News]
+2. Use bullet points
+3. [Customer Profile], [Wealth Portfolio] and [Market News] in Traditional Chinese (Cantonese tone)
+4. Address all feedback points"""
+
+
+def build_judge_context(customer_profile: str, market_news: str) -> str:
+    """Build the part of the judge task that is the same for every iteration"""
+    return f"""The original content:
+customer_profile:
+================================================================
+{customer_profile}
+================================================================
+
+market_news:
+================================================================
+{market_news}
+================================================================
+
+"""
+
 
-# doubao_llm = DoubaoLLM()
-if cfg.llm_provider.upper() == "DOUBAO":
-    llm_provider = DoubaoLLM()
-elif cfg.llm_provider.upper() == "OPENAI":
-    llm_provider = OpenAILLM()
-else:
-    llm_provider = DoubaoLLM() # default to doubao
-
-
-# Create the Summarization Agent
-summarizer_agent = Agent(
-    role='Wealth Management Report Generator',
-    goal='Generate a structured, three-section output using provided customer data to assist Relationship Managers (RMs) in delivering personalized service & insights to each client through face-to-face meeting',
-    backstory="""You are an expert wealth management advisor with years of experience in:
-    - Customer profiling and behavioral analysis
-    - Investment portfolio management and optimization
-    - Market analysis and trend identification
-    You excel at creating personalized, actionable insights for Relationship Managers.
-    You are fluent in both Traditional Chinese (Cantonese tone) and British English.""",
-    verbose=True,
-    allow_delegation=False,
-    llm=llm_provider
-)
-
-# Create the Judge Agent
-judge_agent = Agent(
-    role='Wealth Report Quality Assessor',
-    goal='Evaluate the quality and completeness of wealth management reports',
-    backstory="""You are a senior quality assessor specializing in wealth management reports.
-    You evaluate reports based on:
-    - Completeness of all three sections (Customer Profile, Wealth Portfolio, Market News)
-    - Accuracy and relevance of insights
-    - Professional presentation and formatting
-    - Language quality (Traditional Chinese in Cantonese tone & British English)
-    You rate reports on a scale of 1-5.""",
-    verbose=True,
-    allow_delegation=False,
-    llm=llm_provider
-)
-
-
-def create_summary_task(customer_profile: str, market_news: str, feedback: str = None, previous_summary: str = None, iteration: int = 1):
-    """Create a wealth management report generation task"""
+def create_summary_task(customer_profile: str, market_news: str, feedback: str = None, previous_summary: str = None, iteration: int = 1, agent: Agent = None, context: str = None):
+    """Create a wealth management report generation task
+
+    context is the output of build_revision_context(), built once per customer and reused across iterations
+    """
     
     if iteration == 1:
         task_description = f"""Generate a comprehensive wealth management report for a Relationship Manager meeting.
@@ -112,31 +170,20 @@ Judge's feedback:
 
 Please create an improved report addressing the feedback while maintaining the three-section structure.
 
-customer profile
-================================================================
-{customer_profile}
-================================================================
-
-latest market news
-================================================================
-{market_news}
-================================================================
-
-Remember to:
-1. Maintain THREE sections: [Customer Profile], [Wealth Portfolio], [Market News]
-2. Use bullet points
-3. [Customer Profile], [Wealth Portfolio] and [Market News] in Traditional Chinese (Cantonese tone)
-4. Address all feedback points"""
+""" + (context or build_revision_context(customer_profile, market_news))
 
     return Task(
         description=task_description,
         expected_output="A complete three-section wealth management report with Customer Profile, Wealth Portfolio, and Market News sections",
-        agent=summarizer_agent
+        agent=agent or create_summarizer_agent()
     )
 
 
-def create_judge_task(customer_profile: str, market_news: str, report: str, iteration: int = 1):
-    """Create a judge task to evaluate the wealth management report"""
+def create_judge_task(customer_profile: str, market_news: str, report: str, iteration: int = 1, agent: Agent = None, context: str = None):
+    """Create a judge task to evaluate the wealth management report
+
+    context is the output of build_judge_context(), built once per customer and reused across iterations
+    """
     return Task(
         description=f"""Evaluate this wealth management report (iteration {iteration}).
 
@@ -148,18 +195,7 @@ Check for:
 5. Professional formatting with bullet points
 6. Language quality and appropriateness
 
-The original content:
-customer_profile:
-================================================================
-{customer_profile}
-================================================================
-
-market_news:
-================================================================
-{market_news}
-================================================================
-
-The report to evaluate:
+""" + (context or build_judge_context(customer_profile, market_news)) + f"""The report to evaluate:
 {report}
 
 Format your response as:
@@ -173,7 +209,7 @@ Score criteria:
 2 = Major omissions or poor quality
 1 = Incomplete or unusable""",
         expected_output="Score and specific feedback",
-        agent=judge_agent
+        agent=agent or create_judge_agent()
     )
 
 
@@ -184,11 +220,7 @@ def translate_to_english(chinese_text: str) -> str:
             {"role": "user", "content": f"Translate the following Traditional Chinese text to British English, maintaining the professional tone and all formatting (including bullet points and section headers).\n\n{chinese_text}"}
         ]
         # here we must use absolute model name
-        # absolute_model_name = doubao_llm.model.split('/')[-1]
-
-        model = llm_provider.model
-        abolute_model_name = model.split('/')[-1] if '/' in model else model
-        result = llm_provider.invoke(messages=messages, model=abolute_model_name)
+        result = llm_provider.invoke(messages=messages, model=llm_provider.absolute_model)
         return result
         
     except Exception as e:
@@ -202,135 +234,144 @@ def iterative_summary_improvement(customer_identity: str, customer_profile: str,
     score = 0
     feedback = None
     previous_summary = None
+    summarizer_agent = create_summarizer_agent()
+    judge_agent = create_judge_agent()
+    # The profile and news blocks do not change between iterations, so build them once
+    revision_context = build_revision_context(customer_profile, market_news)
+    judge_context = build_judge_context(customer_profile, market_news)
 
     # Save the original content
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    save_dir = f"outputs/{customer_identity}"
-    iteration_filename = f"wealth_report_iterations_for_{customer_identity}_{timestamp}.txt"
-
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-        
-    with open(save_dir+'/'+iteration_filename, 'w', encoding='utf-8') as f:
-        f.write("WEALTH MANAGEMENT REPORT GENERATION\n" )
-        f.write("="*50 +"\n")
-        f.write("Customer Data:\n")
-        f.write(customer_profile)
-        f.write("\n\n" )
-    
-    while score < score_threshold and iteration <= max_iterations:
-        print(f"\n--- Iteration {iteration} ---")
-        
-        # Create summary task
-        summary_task = create_summary_task(
-            customer_profile=customer_profile,
-            market_news=market_news,
-            feedback=feedback,
-            previous_summary=previous_summary,
-            iteration=iteration
-        )
-        
-        # Create crew for summarization
-        summary_crew = Crew(
-            agents=[summarizer_agent],
-            tasks=[summary_task],
-            process=Process.sequential,
-            verbose=True
-        )
-
-        # Generate report
-        summary_result = summary_crew.kickoff()
-        summary = str(summary_result)
-
-        # Clean thinking tags
-        summary = re.sub(r'<think>.*?</think>','',summary, flags=re.DOTALL)
-        summary = re.sub(r'<thinking>,*?</thinking>','',summary, flags=re.DOTALL)
-        
-        # Save current summary for next iteration
-        previous_summary= summary
-        
-        # Create judge task
-        judge_task= create_judge_task(customer_profile, market_news, summary, iteration)
-        
-        # Create crew for judging
-        judge_crew = Crew(
-            agents=[judge_agent],
-            tasks=[judge_task],
-            process=Process.sequential,
-            verbose=True
-        )
-
-        # Evaluate report
-        judge_result = judge_crew.kickoff()
-        judge_output = str(judge_result)
-
-        # Parse score and feedback
-        try:
-            score_line = [line for line in judge_output.split('\n')if 'Score:' in line][0]
-            score = int(score_line.split(':')[1].strip().split()[0])
-        except:
-            score =1
-
-        try:
-            feedback_start = judge_output.find("Feedback:")
-            if feedback_start != -1:
-                feedback = judge_output[feedback_start + 9:].strip()
-            else:
-                feedback ="No specific feedback provided"
-        except:
-            feedback = "Error parsing feedback"
-
-        # Save iteration result
-        with open(save_dir+'/'+iteration_filename, 'a', encoding='utf-8') as f:
-            f.write(f"\n{'='* 50}\n")
-            f.write(f"ITERATION {iteration} -Score: {score}/5\n" )
-            f.write(f"{'=' * 50}\n")
-            f.write(f"\nGenerated Report:\n{summary}\n")
-            f.write(f"\nJudge Evaluation:\n{judge_output}\n")
-        
-        print(f"Score: {score}/5")
-
-        if score >= 5:
-            print("Perfect score achieved!")
-            with open(save_dir+'/'+iteration_filename, 'a', encoding='utf-8') as f:
-                f.write(f"\n{'='* 50}\n")
-                f.write("FINAL RESULT: Perfect score achieved!\n" )
-                f.write(f"{'='* 50}\n")
-                f.write(f"\nFINAL REPORT:\n{summary}\n")
-        break
-
-        iteration +=1
-
-    if iteration > max_iterations:
-        print(f"Maximum iterations({max_iterations}) reached.")
-        with open(save_dir+'/'+iteration_filename, 'a', encoding='utf-8') as f:
-            f.write(f"\n{'=' * 50}\n" )
-            f.write(f"FINAL RESULT: Maximum iterations reached. Final score: {score}/5\n")
-            f.write(f"{'=' * 50}\n")
-            f.write(f"\nFINAL REPORT:\n{summary}\n")
-
-    print(f"\nAll results saved to: {save_dir+'/'+iteration_filename}")
+    save_dir = Path("outputs") / customer_identity
+    iteration_path = save_dir / f"wealth_report_iterations_for_{customer_identity}_{timestamp}.txt"
+    chinese_report_path = save_dir / f"final_report_in_traditional_chinese_{timestamp}.txt"
+    english_report_path = save_dir / f"final_report_in_english_{timestamp}.txt"
+
+    save_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(iteration_path, 'wb', buffering=1024 * 1024) as log:
+        log.write(b"".join([
+            b"WEALTH MANAGEMENT REPORT GENERATION\n",
+            _LOG_RULE,
+            b"Customer Data:\n",
+            customer_profile.encode('utf-8'),
+            b"\n\n"
+        ]))
+
+        while score < score_threshold and iteration <= max_iterations:
+            print(f"\n--- Iteration {iteration} ---")
+
+            # Create summary task
+            summary_task = create_summary_task(
+                customer_profile=customer_profile,
+                market_news=market_news,
+                feedback=feedback,
+                previous_summary=previous_summary,
+                iteration=iteration,
+                agent=summarizer_agent,
+                context=revision_context
+            )
+
+            # Create crew for summarization
+            summary_crew = Crew(
+                agents=[summarizer_agent],
+                tasks=[summary_task],
+                process=Process.sequential,
+                verbose=True
+            )
+
+            # Generate report
+            summary_result = summary_crew.kickoff()
+            summary = str(summary_result)
+
+            # Clean thinking tags
+            summary = _THINK_RE.sub('', summary)
+
+            # Save current summary for next iteration
+            previous_summary= summary
+
+            # Create judge task
+            judge_task= create_judge_task(customer_profile, market_news, summary, iteration, agent=judge_agent, context=judge_context)
+
+            # Create crew for judging
+            judge_crew = Crew(
+                agents=[judge_agent],
+                tasks=[judge_task],
+                process=Process.sequential,
+                verbose=True
+            )
+
+            # Evaluate report
+            judge_result = judge_crew.kickoff()
+            judge_output = str(judge_result)
+
+            # Parse score and feedback
+            match = _SCORE_RE.search(judge_output)
+            score = int(match.group(1)) if match else 1
+
+            match = _FEEDBACK_RE.search(judge_output)
+            feedback = match.group(1).strip() if match else "No specific feedback provided"
+
+            # Save iteration result
+            log.write(b"".join([
+                b"\n", _LOG_RULE,
+                f"ITERATION {iteration} -Score: {score}/5\n".encode('utf-8'),
+                _LOG_RULE,
+                f"\nGenerated Report:\n{summary}\n".encode('utf-8'),
+                f"\nJudge Evaluation:\n{judge_output}\n".encode('utf-8')
+            ]))
+            # Make each finished iteration visible on disk while the next one runs
+            log.flush()
+
+            print(f"Score: {score}/5")
+
+            if score >= 5:
+                print("Perfect score achieved!")
+                log.write(b"".join([
+                    b"\n", _LOG_RULE,
+                    b"FINAL RESULT: Perfect score achieved!\n",
+                    _LOG_RULE,
+                    f"\nFINAL REPORT:\n{summary}\n".encode('utf-8')
+                ]))
+                break
+
+            # Threshold reached: stop here so the max-iterations result below is not written as well
+            if score >= score_threshold:
+                break
+
+            iteration +=1
+
+        if iteration > max_iterations:
+            print(f"Maximum iterations({max_iterations}) reached.")
+            log.write(b"".join([
+                b"\n", _LOG_RULE,
+                f"FINAL RESULT: Maximum iterations reached. Final score: {score}/5\n".encode('utf-8'),
+                _LOG_RULE,
+                f"\nFINAL REPORT:\n{summary}\n".encode('utf-8')
+            ]))
+
+    print(f"\nAll results saved to: {iteration_path}")
 
     # save final result
-    with open(f"{save_dir}/final_report_in_traditional_chinese_{timestamp}.txt", 'w', encoding='utf-8') as f:
+    with open(chinese_report_path, 'w', encoding='utf-8') as f:
         f.write(f"{summary}\n")
-    print(f"Traditional Chinese version saved to: {save_dir}/final_report_in_traditional_chinese_{timestamp}.txt")
+    print(f"Traditional Chinese version saved to: {chinese_report_path}")
 
     # Translate and save English version
     print("Translating report to English...")
     english_summary=translate_to_english(summary)
 
-    with open(f"{save_dir}/final_report_in_english_{timestamp}.txt", 'w', encoding='utf-8') as f:
-        f.write(f"{english_summary}n" )
+    with open(english_report_path, 'w', encoding='utf-8') as f:
+        f.write(f"{english_summary}\n" )
 
-    print(f"English version saved to: {save_dir}/final_report_in_english_{timestamp}.txt")
+    print(f"English version saved to: {english_report_path}")
 
-    return save_dir+'/'+iteration_filename, summary
+    return str(iteration_path), summary
 
 
 def load_market_news(input_dir: str="input_docs")-> str:
 
-    market_news_content = []
+    market_news_content = io.StringIO()
 
     supported_extensions = ['*.txt', '*.md']
     
@@ -356,9 +397,12 @@ def load_market_news(input_dir: str="input_docs")-> str:
                 content = f.read().strip()
             
                 if content:
-                    market_news_content.append(f"=== Source: {filename} ===")
-                    market_news_content.append(content)
-                    market_news_content.append("")
+                    # Blank line between sources
+                    if market_news_content.tell():
+                        market_news_content.write("\n")
+                    market_news_content.write(f"=== Source: {filename} ===\n")
+                    market_news_content.write(content)
+                    market_news_content.write("\n")
 
             print(f"Loaded: {filename}")
     
@@ -367,8 +411,8 @@ def load_market_news(input_dir: str="input_docs")-> str:
             continue
 
     # merge all news
-    if market_news_content:
-        return "\n".join(market_news_content)
+    if market_news_content.tell():
+        return market_news_content.getvalue()
     else:
         return "No market news content found."
     
@@ -379,16 +423,29 @@ if __name__ == "__main__":
     #     market_news = f.read().strip()
 
     # Customer data (already parsed in the task)
-    with open(customer_file)as f:
-        header = f.readline().strip()# header
-        for line in f:
-            line = line.strip()
-            if line:
-                customer_profile = "\n".join([header, line])
-                parser = SchemaParser("customer_data/data_schema.txt")
-                formatted_customer_profile = parser.format_customer_data_section(customer_profile, False)
+    parser = SchemaParser("customer_data/data_schema.txt")
+    customers = []
+    with open(customer_file, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        headers = next(reader, []) # header row, shared by every profile
+        for row in reader:
+            # skip blank and whitespace-only lines
+            if any(field.strip() for field in row):
+                # rows are passed on as parsed, so quoted fields (even multi-line ones) stay intact
+                formatted_customer_profile = parser.format_customer_row(headers, row, False)
                 # customer identity
-                customer_identity = line.split(',')[0]
-                # Run the iterative improvement process
-                result_file, final_report = iterative_summary_improvement(customer_identity, formatted_customer_profile, market_news)
-                print(f"nProcess completed, check '{result_file}' for all iteration results.")
\ No newline at end of file
+                customer_identity = row[0].strip()
+                customers.append((customer_identity, formatted_customer_profile))
+
+    # LLM calls are network-bound, so customers are processed concurrently
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            (customer_identity, executor.submit(iterative_summary_improvement, customer_identity, formatted_customer_profile, market_news))
+            for customer_identity, formatted_customer_profile in customers
+        ]
+        for customer_identity, future in futures:
+            try:
+                result_file, final_report = future.result()
+                print(f"\nProcess completed, check '{result_file}' for all iteration results.")
+            except Exception as e:
+                print(f"Error processing customer {customer_identity}: {str(e)}")
@@ -7,6 +7,7 @@ class OpenAILLM:
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         self.base_url = base_url or os.environ.get("OPENAI_API_BASE")
         self.model = model or os.environ.get("OPENAI_MODEL", "gpt-4o")
+        self.absolute_model = self.model.split('/', 1)[-1] # model name without the litellm provider prefix, for direct api calls
         self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
 
     def invoke(self, messages, model=None):
@@ -1,27 +1,120 @@
+import functools
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pdfplumber
 import io
 import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Optional, Tuple, List, Dict
+from typing import Optional, Tuple, List, Dict, TextIO
 import logging
+import multiprocessing
 import re
-from crewai import Agent, Task, Crew
+import time
+
+try:
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_c
+except ImportError:
+    pdfium = None
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
 
 from config_parser import get_config
 
-from doubao_llm import DoubaoLLM
-from openai_llm import OpenAILLM
+# crewai and the LLM clients are imported where they are used, so processes that only parse
+# pages (each re-imports this module under the spawn start method) do not load them
+
+# Only ruled tables are detected. These are pdfplumber's defaults, pinned here because
+# _extract_tables relies on the "lines" strategies finding nothing on pages without edges
+_TABLE_SETTINGS = {
+    "vertical_strategy": "lines",
+    "horizontal_strategy": "lines",
+    "snap_tolerance": 3
+}
+
+_RE_BLANKS = re.compile(r'\n\s*\n')
+# <think> and <thinking> blocks of reasoning models, removed in one pass
+_RE_TAGS = re.compile(r'<think>.*?</think>|<thinking>.*?</thinking>', re.DOTALL)
+# Whole lines containing a common header/footer marker, with their line break
+_RE_HEADER_FOOTER = re.compile(r'^.*(?:Page|免责声明|Disclaimer|页码).*\n?', re.MULTILINE)
+
+_DOWNLOAD_HEADERS = {
+    "User-Agent":"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+# Retries of a download after a connection error or timeout, waiting backoff * 2**attempt seconds in between
+_DOWNLOAD_RETRIES = 3
+_DOWNLOAD_BACKOFF = 0.5
+
+# Shared keep-alive session used by download_pdf, so repeated
+# downloads from the same host reuse the TCP/TLS connection
+_SESSION = requests.Session()
+_SESSION.headers.update(_DOWNLOAD_HEADERS)
+_SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=Retry(total=_DOWNLOAD_RETRIES, backoff_factor=_DOWNLOAD_BACKOFF)))
+_SESSION.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=Retry(total=_DOWNLOAD_RETRIES, backoff_factor=_DOWNLOAD_BACKOFF)))
+
+# Below this many pages to parse with pdfplumber, process start-up costs more than it saves
+_MIN_PAGES_FOR_POOL = 4
+
+# Pages with more glyphs than this are extracted with pdfplumber's simple line clustering
+# instead of its word extraction, which bounds the time spent on pathological pages
+_MAX_CHARS_FOR_WORD_EXTRACTION = 20000
+
+
+def _extract_tables(page)-> List:
+    """Extract ruled tables from a pdfplumber page, skipping the table finder on pages without any edges"""
+    if not (page.lines or page.rects or page.curves):
+        return []
+    return page.extract_tables(table_settings=_TABLE_SETTINGS)
 
-# Load configuration at program start
-config = get_config()
-cfg = config.get_config()
 
-# Set environment variables
-config.set_environment_variables()
+def _extract_page_text(page)-> str:
+    """Extract the text of a pdfplumber page"""
+    if len(page.chars) > _MAX_CHARS_FOR_WORD_EXTRACTION:
+        extract_text_simple = getattr(page, 'extract_text_simple', None) # pdfplumber >= 0.10
+        if extract_text_simple is not None:
+            return extract_text_simple() or ''
+    return page.extract_text() or ''
+
+
+def _extract_pdfplumber_page(page, extract_text: bool)-> Tuple[str, List]:
+    """Return (text, tables) of a pdfplumber page, text is only extracted if requested"""
+    text = _extract_page_text(page) if extract_text else ''
+    return text, _extract_tables(page)
+
+
+# pdfplumber document opened once per worker process by _init_page_worker
+_worker_pdf = None
+
+
+def _init_page_worker(pdf_content: bytes)-> None:
+    global _worker_pdf
+    # No laparams, see extract_text_from_pdf_advanced
+    _worker_pdf = pdfplumber.open(io.BytesIO(pdf_content))
+
+
+def _extract_page_in_worker(page_index: int, extract_text: bool)-> Tuple[str, List]:
+    return _extract_pdfplumber_page(_worker_pdf.pages[page_index], extract_text)
+
+def _cfg():
+    """
+    Load configuration and set environment variables on first use rather than at import
+
+    Not cached here: the config parser already reuses its Config until config.json changes,
+    and reloads it (re-exporting the environment variables) when it does.
+    """
+    config = get_config()
+    config.set_environment_variables()
+    return config.get_config()
+
 
 class AdvancedPDFDownloader:
-    """Advanced PDF download and text extraction utility class (using pdfplumber)"""
+    """Advanced PDF download and text extraction utility class (using pypdfium2 and pdfplumber)"""
 
     def __init__(self, output_dir: str="downloaded_pdfs"):
         """
@@ -52,15 +145,11 @@ class AdvancedPDFDownloader:
         return logger
     
     def download_pdf(self,url: str,timeout:int = 60)-> Optional[bytes]:
-        """Download PDF file"""
+        """Download PDF file on the shared keep-alive requests session"""
         try:
             self.logger.info(f"Downloading PDF from: {url}")
 
-            headers ={
-                "User-Agent":"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-
-            response = requests.get(url, headers=headers, timeout=timeout)
+            response = _SESSION.get(url, timeout=timeout)
             response.raise_for_status()
 
             self.logger.info(f"Successfully downloaded PDF, size: {len(response.content)} bytes")
@@ -70,98 +159,193 @@ class AdvancedPDFDownloader:
             self.logger.error(f"Failed to download Pdf: {str(e)}" )
             return None
         
-    def extract_text_from_pdf_advanced(self, pdf_content: bytes)-> Dict[str, any]:
+    def _scan_pages_pypdfium2(self, pdf_content: bytes)-> Tuple[List[str], List[bool]]:
         """
-        Advanced text extraction using pdfplumber
+        Extract the text of every page with pypdfium2 (PDFium C++ core)
 
         Returns:
-            Dictionary containing text, tables, and other content
+            (page texts, whether each page has any path objects, i.e. possible table rules)
         """
+        pdf = pdfium.PdfDocument(pdf_content)
         try:
-            self.logger.info("Extracting content from PDF using pdfplumber" )
+            texts = []
+            has_paths = []
+            for page in pdf:
+                textpage = page.get_textpage()
+                # PDFium uses CRLF line breaks, keep them in line with pdfplumber's output
+                texts.append(textpage.get_text_range().replace('\r\n', '\n'))
+                has_paths.append(next(page.get_objects(filter=(pdfium_c.FPDF_PAGEOBJ_PATH,)), None) is not None)
+                textpage.close()
+                page.close()
+            return texts, has_paths
+        finally:
+            pdf.close()
+
+    def _scan_pages_pymupdf(self, pdf_content: bytes)-> Tuple[List[str], List[bool]]:
+        """
+        Extract the text of every page with PyMuPDF (MuPDF C core)
+
+        Returns:
+            (page texts, whether each page has any vector drawings, i.e. possible table rules)
+        """
+        with fitz.open(stream=pdf_content, filetype="pdf") as doc:
+            texts = []
+            has_paths = []
+            for page in doc:
+                # MuPDF ends every text line with a line break, drop the last one like pdfplumber does
+                texts.append(page.get_text("text").rstrip('\n'))
+                # get_cdrawings returns the raw C-level paths without building Python path objects
+                # for each of them like get_drawings does (which older PyMuPDF versions only have)
+                get_drawings = getattr(page, "get_cdrawings", None) or page.get_drawings
+                has_paths.append(bool(get_drawings()))
+            return texts, has_paths
+
+    @staticmethod
+    def _page_pool_workers(page_count: int)-> int:
+        """Number of processes to parse page_count pages with, 0 where parsing them in this process is cheaper"""
+        # Worker start-up only pays off when workers are forked: spawned ones (Windows, macOS) start a
+        # new interpreter and re-import the running script and its imports before parsing anything
+        if page_count < _MIN_PAGES_FOR_POOL or multiprocessing.get_start_method() != "fork":
+            return 0
+        workers = min(os.cpu_count() or 1, page_count)
+        return workers if workers >= 2 else 0
+
+    def _extract_pages_parallel(self, pdf_content: bytes, page_indexes: List[int], extract_text: bool, workers: int)-> Dict[int, Tuple[str, List]]:
+        """Run pdfplumber on the given pages across worker processes, each worker opens the PDF once"""
+        self.logger.info(f"Parsing {len(page_indexes)} pages with pdfplumber in {workers} processes")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker, initargs=(pdf_content,)) as executor:
+            futures = [executor.submit(_extract_page_in_worker, i, extract_text) for i in page_indexes]
+            return {i: future.result() for i, future in zip(page_indexes, futures)}
+
+    def extract_text_from_pdf_advanced(self, pdf_content: bytes, backend: str = "pypdfium2", include_metadata: bool = False)-> Dict[str, any]:
+        """
+        Advanced text extraction
+
+        Args:
+            pdf_content: PDF file content
+            backend: Text extraction backend, "pypdfium2" (default, much faster), "pymupdf" or "pdfplumber".
+                     Tables are always extracted with pdfplumber, on pages that have ruling lines only.
+            include_metadata: Whether to read the PDF Info dictionary, left empty by default since resolving it is costly
+
+        Returns:
+            Dictionary of per-page lists: 'texts' (page text) and 'tables_per_page' (page tables),
+            plus the PDF 'metadata'
+        """
+        try:
+            if backend == "pymupdf" and fitz is None:
+                self.logger.warning("pymupdf is not installed, falling back to pypdfium2 for text extraction")
+                backend = "pypdfium2"
+            if backend == "pypdfium2" and pdfium is None:
+                self.logger.warning("pypdfium2 is not installed, falling back to pdfplumber for text extraction")
+                backend = "pdfplumber"
+            self.logger.info(f"Extracting content from PDF using {backend}")
+
+            if backend == "pypdfium2":
+                page_texts, page_has_paths = self._scan_pages_pypdfium2(pdf_content)
+            elif backend == "pymupdf":
+                page_texts, page_has_paths = self._scan_pages_pymupdf(pdf_content)
+            else:
+                page_texts, page_has_paths = None, None
 
             pdf_file = io.BytesIO(pdf_content)
             extracted_content = {
-                'text':[],
-                'tables':[],
+                'texts':[],
+                'tables_per_page':[],
                 'metadata':{}
             }
 
-            with pdfplumber.open(pdf_file) as pdf:
-                # Extract metadate
-                extracted_content['metadata']= pdf.metadata
-                
-                # Iterate through each page
-                for i, page in enumerate(pdf.pages):
-                    page_content = {
-                        'page': i + 1,
-                        'text': '',
-                        'tables': []
-                    }
-
-                    # Extract text
-                    text = page.extract_text()
-                    if text:
-                        page_content['text']= text
-
-                    # Extract tables
-                    tables = page.extract_tables()
-                    if tables:
-                        page_content['tables']= tables
-
-                    extracted_content['text'].append(page_content)
-
-                    # Store tables separately if available
-                    if tables:
-                        extracted_content['tables'].extend(tables)
-
-            self.logger.info(f"successfully extracted content from {len(extracted_content['text'])} pages")
+            extract_text = page_texts is None
+            if page_texts is not None:
+                page_count = len(page_texts)
+                # Pages that need pdfplumber: only those that may hold ruled tables
+                # (pages the text backend found no drawn paths on cannot)
+                page_indexes = [i for i, has_paths in enumerate(page_has_paths) if has_paths]
+            else:
+                # Every page, for its text, once pdfplumber has counted them
+                page_count = None
+                page_indexes = None
+
+            page_results = {}
+            # pdfplumber (and pdfminer's page tree parse) is skipped entirely when no page needs it
+            if page_indexes is None or page_indexes or include_metadata:
+                # laparams is deliberately not passed: pdfplumber only runs pdfminer's layout analysis
+                # (the costly char and text box grouping) when it is given, and we need none of it
+                with pdfplumber.open(pdf_file) as pdf:
+                    # Extract metadate
+                    if include_metadata:
+                        extracted_content['metadata']= pdf.metadata
+                    pdfplumber_page_count = len(pdf.pages)
+
+                    if page_indexes is None:
+                        page_count = pdfplumber_page_count
+                        page_indexes = list(range(page_count))
+                    elif page_indexes and page_indexes[-1] >= pdfplumber_page_count:
+                        # Damaged file the two parsers disagree on, pages pdfplumber cannot see have no tables
+                        self.logger.warning(f"pdfplumber found {pdfplumber_page_count} of {page_count} pages, skipping tables of the missing ones")
+                        page_indexes = [i for i in page_indexes if i < pdfplumber_page_count]
+
+                    page_results = None
+                    workers = self._page_pool_workers(len(page_indexes))
+                    if workers:
+                        try:
+                            page_results = self._extract_pages_parallel(pdf_content, page_indexes, extract_text, workers)
+                        # NotImplementedError: no working sem_open on this host (e.g. serverless runtimes)
+                        except (OSError, BrokenProcessPool, NotImplementedError) as e:
+                            self.logger.warning(f"Parallel page extraction failed, continuing sequentially: {str(e)}")
+                    if page_results is None:
+                        page_results = {i: _extract_pdfplumber_page(pdf.pages[i], extract_text) for i in page_indexes}
+
+            # Collect text and tables of each page, in page order
+            no_result = ('', [])
+            results = [page_results.get(i, no_result) for i in range(page_count)]
+            extracted_content['texts'] = page_texts if page_texts is not None else [text for text, _ in results]
+            extracted_content['tables_per_page'] = [tables for _, tables in results]
+
+            self.logger.info(f"successfully extracted content from {page_count} pages")
             return extracted_content
         
         except Exception as e:
             self.logger.error(f"Failed to extract content from PDF: {str(e)}")
-            return {'text': [], 'tables': [], 'metadata':{}}
+            return {'texts': [], 'tables_per_page': [], 'metadata':{}}
         
-    def format_content(self, extracted_content: Dict[str, any])-> str:
+    def format_content(self, extracted_content: Dict[str, any], out: TextIO)-> None:
         """
         Format extracted content into readable text
 
         Args:
             extracted_content; Dictionary of extracted content
-        
-        Returns:
-            Formatted text
+            out: Text stream the formatted text is written to, one line at a time
         """
-        formatted_text =[]
+        write = out.write
 
         # Add metadata(if available)
         if extracted_content.get('metadata'):
-            formatted_text.append("=== PDF Metadata ===" )
+            write("=== PDF Metadata ===\n" )
             for key,value in extracted_content['metadata'].items():
                 if value:
-                    formatted_text.append(f"{key}: {value}")
-            formatted_text.append("")
-        
+                    write(f"{key}: {value}\n")
+            write("\n")
+
         # Add content for each page
-        for page_data in extracted_content.get('text', []):
-            formatted_text.append(f"\n{'='*50}")
-            formatted_text.append(f"Page {page_data['page']}")
-            formatted_text.append('='*50)
-           
+        pages = zip(extracted_content.get('texts', []), extracted_content.get('tables_per_page', []))
+        for page_number, (text, tables) in enumerate(pages, 1):
+            write(f"\n{'='*50}\n")
+            write(f"Page {page_number}\n")
+            write('='*50 + "\n")
+
             # Add text
-            if page_data.get('text'):
-               formatted_text.append(page_data['text'])
+            if text:
+               write(text)
+               write("\n")
 
             # Add tables (if available)
-            if page_data.get('tables'):
-                for j, table in enumerate(page_data['tables']):
-                    formatted_text.append(f"\n[Table {j+1}]")
-                    for row in table:
-                        # Filter None values and join cells
-                        row_text =' | '.join(str(cell)if cell else ''for cell in row)
-                        formatted_text.append(row_text)
-
-        return '\n'.join(formatted_text)
+            if tables:
+                for j, table in enumerate(tables):
+                    table_lines = [f"\n[Table {j+1}]"]
+                    # Filter None values and join cells
+                    table_lines.extend([' | '.join([str(cell) if cell else '' for cell in row]) for row in table])
+                    table_lines.append('')
+                    write('\n'.join(table_lines))
     
     def clean_market_news_text(self,text: str)-> str:
         """
@@ -174,19 +358,10 @@ class AdvancedPDFDownloader:
             Cleaned text
         """
         # Remove extra blank lines
-        text = re.sub(r'\n\s*\n','\n\n', text)
+        text = _RE_BLANKS.sub('\n\n', text)
 
         # Remove repetitive headers/footers
-        lines = text.split('\n')
-        cleaned_lines =[]
-
-        for line in lines:
-            # Skip common header/footer patterns
-            if any(pattern in line for pattern in ['Page', '免责声明', 'Disclaimer', '页码']):
-                continue
-            cleaned_lines.append(line)
-
-        return '\n'.join(cleaned_lines)
+        return _RE_HEADER_FOOTER.sub('', text)
     
     def download_and_convert_advanced(self, url: str, output_filename: Optional[str] = None)-> Tuple[bool, str]:
         """
@@ -213,12 +388,14 @@ class AdvancedPDFDownloader:
 
         # Extract content
         extracted_content =self.extract_text_from_pdf_advanced(pdf_content)
-        if not extracted_content['text']:
+        if not extracted_content['texts']:
             return False, "Failed to extract content from PDF"
         
         # Format content
-        formatted_text= self.format_content(extracted_content)
-        cleaned_text =self.clean_market_news_text(formatted_text)
+        # (blank-line collapsing matches across line breaks, so cleaning runs on the complete text)
+        formatted_text = io.StringIO()
+        self.format_content(extracted_content, formatted_text)
+        cleaned_text =self.clean_market_news_text(formatted_text.getvalue())
 
         # Save text
         filepath = os.path.join(self.output_dir, output_filename)
@@ -231,29 +408,43 @@ class AdvancedPDFDownloader:
             return False,f"Failed to save text: {str(e)}"
 
 
-def optimize_market_news_with_llm(raw_content: str)-> str:
+def _truncate_for_llm(raw_content: str, max_chars: int)-> str:
+    """
+    Cut content to at most max_chars characters (0 for no limit), at the last line break before the limit where there is one
 
+    Content is only cut as a safeguard against oversized input, a warning is logged whenever it is.
     """
-     Pptimize market news content using LLM
+    if max_chars <= 0 or len(raw_content) <= max_chars:
+        return raw_content
+    truncated = raw_content[:max_chars]
+    line_end = truncated.rfind('\n')
+    if line_end > 0:
+        truncated = truncated[:line_end]
+    logging.getLogger(__name__).warning(
+        f"Market news has {len(raw_content)} characters, only the first {len(truncated)} are sent to the LLM "
+        f"(raise MAX_LLM_INPUT_CHARS in the config file to send more)"
+    )
+    return truncated
 
-    Args:
-         raw_content; Raw content extracted from PDF
 
-    Returns:
-        Optimized market news content
+@functools.lru_cache(maxsize=1)
+def _get_optimizer_agent(llm_provider_name: str, api_key: str, base_url: str, model: str):
     """
-    # Set LLM environment variables (if not already set)
-    import os
+    Create the market news optimization Agent and reuse it, with its LLM client, across calls
 
-    if cfg.llm_provider.upper() == "DOUBAO":
-        llm_provider = DoubaoLLM()
-    elif cfg.llm_provider.upper() == "OPENAI":
-        llm_provider = OpenAILLM()
+    The cache is keyed on the provider and its settings, so a changed key, endpoint or model
+    in config.json builds a new LLM client instead of keeping the old one.
+    """
+    from crewai import Agent
+
+    if llm_provider_name == "OPENAI":
+        from openai_llm import OpenAILLM
+        llm_provider = OpenAILLM(api_key=api_key, base_url=base_url, model=model)
     else:
-        llm_provider = DoubaoLLM() # default to doubao
+        from doubao_llm import DoubaoLLM
+        llm_provider = DoubaoLLM(api_key=api_key, base_url=base_url, model=model) # default to doubao
 
-    # Create optimization Agent
-    optimizer_agent = Agent(
+    return Agent(
             role='Market News Content Optimizer',
             goal='Optimize and format market news content for better readability',
             backstory="""You are an expert financial content editor specializing in:
@@ -267,10 +458,34 @@ def optimize_market_news_with_llm(raw_content: str)-> str:
             llm=llm_provider
         )
 
+
+def optimize_market_news_with_llm(raw_content: str)-> str:
+
+    """
+     Pptimize market news content using LLM
+
+    Args:
+         raw_content; Raw content extracted from PDF
+
+    Returns:
+        Optimized market news content
+    """
+    from crewai import Task, Crew
+
+    cfg = _cfg()
+    llm_provider_name = cfg.llm_provider.upper()
+    if llm_provider_name == "OPENAI":
+        llm_settings = (cfg.openai_api_key, cfg.openai_api_base, cfg.openai_model)
+    else:
+        llm_settings = (cfg.doubao_api_key, cfg.doubao_api_endpoint, cfg.doubao_model)
+
+    # Optimization Agent, created on first use and whenever the LLM settings change
+    optimizer_agent = _get_optimizer_agent(llm_provider_name, *llm_settings)
+
     # Create optimization task
     optimization_task = Task(
         description=f"""Please optimize the following market news content:
-{raw_content}  # Limit input length
+{_truncate_for_llm(raw_content, cfg.max_llm_input_chars)}
 
 Requirements:
 1. Remove all metadata and page headers/footers
@@ -297,9 +512,7 @@ Output a clean, well-structured market news report.""",
     try:
         result = crew.kickoff()
         # Clean thinking tags from result
-        optimized_content =str(result)
-        optimized_content = re.sub(r'<think>,*?</think>','',optimized_content, flags=re.DOTALL)
-        optimized_content = re.sub(r'<thinking>,*?</thinking>','',optimized_content, flags=re.DOTALL)
+        optimized_content = _RE_TAGS.sub('', str(result))
         return optimized_content
     except Exception as e:
         print(f"Error optimizing content: {str(e)}")
@@ -348,6 +561,29 @@ def download_and_optimize_market_news()-> Tuple[bool, str]:
         return False,f"Error processing content: {str(e)}"
     
 
+# ((path, st_mtime_ns, st_size), content) of the market news file last read by fetch_latest_market_news
+_NEWS_CACHE: Optional[Tuple[Tuple[str, int, int], str]] = None
+
+
+def _read_market_news(path: str, st: os.stat_result)-> str:
+    """Read a market news file, reusing the cached content if it is the same, unchanged file"""
+    global _NEWS_CACHE
+    key = (os.path.realpath(path), st.st_mtime_ns, st.st_size)
+    cache = _NEWS_CACHE
+    if cache is not None and cache[0] == key:
+        return cache[1]
+
+    with open(path, 'r',encoding='utf-8')as f:
+        content = f.read()
+    _NEWS_CACHE = (key, content)
+    return content
+
+
+def _local_day(timestamp: float)-> int:
+    """Number of the local calendar day a Unix timestamp falls on"""
+    return int((timestamp + time.localtime(timestamp).tm_gmtoff) // 86400)
+
+
 # Function for integration with main program
 def fetch_latest_market_news()-> str:
     """
@@ -358,18 +594,18 @@ def fetch_latest_market_news()-> str:
     """
     # First try to &ead optimized content from input docs
     optimized_path ="input_docs/market_news_latest.txt"
-    if os.path.exists(optimized_path):
-        # Check if file is from today
-        file_time = datetime.fromtimestamp(os.path.getmtime(optimized_path))
-        if file_time.date() == datetime.now().date():
-            with open(optimized_path, 'r',encoding='utf-8')as f:
-                return f.read()
+    try:
+        st = os.stat(optimized_path)
+    except FileNotFoundError:
+        st = None
+    # Check if file is from today
+    if st is not None and _local_day(st.st_mtime) == _local_day(time.time()):
+        return _read_market_news(optimized_path, st)
 
     # If not available or not from today, download and optimize new content
     success,result = download_and_optimize_market_news()
     if success:
-        with open(result, 'r',encoding='utf-8') as f:
-            return f.read()
+        return _read_market_news(result, os.stat(result))
     else:
         #Return default content
         return """市場新聞暫時無法獲取。請稍後再試。"""
@@ -1,7 +1,21 @@
+import csv
+import io
 import re
+from collections import defaultdict
 from typing import Dict, List, Tuple, Any
 from dataclasses import dataclass
 from datetime import datetime
+from types import MappingProxyType
+
+# Value mappings for special fields
+_VALUE_MAPPINGS = MappingProxyType({
+    'Y':'是(Yes)',
+    'N':'否(No)',
+    'Male':'男性',
+    'Female':'女性',
+    'Single':'單身',
+    'Married':'已婚'
+})
 
 
 @dataclass
@@ -22,9 +36,11 @@ class SchemaParser:
             '基礎信息':'Basic Information',
             '互動與偏好':'Interaction & Preferences',
             '財務數據':'Financial Data',
-            '交易行為':'Transaction Behavior',
+            '交易行爲':'Transaction Behavior',
             '風險評估':'Risk Assessment'
         }
+        # Categories are output in this order
+        self._category_order = tuple(self.categories)
 
         if schema_file_path:
             self.load_schema(schema_file_path)
@@ -70,68 +86,67 @@ class SchemaParser:
                         )
                             
     def parse_csv_data(self, csv_content: str) -> Dict[str, Any]:
-        """Parse customer data in CSV format"""
-        lines = csv_content.strip().split('\n')
-        if len(lines)< 2:
+        """Parse customer data in CSV format (header line followed by one data line)"""
+        reader = csv.reader(io.StringIO(csv_content.strip()))
+        headers = next(reader, None)
+        values = next(reader, None)
+        if headers is None or values is None:
             return {}
-
-        headers = lines[0].split(',')
-        values = lines[1].split(',')
-
-        # Create data dictionary
-        data_dict = {}
-        for i,header in enumerate(headers):
-            if i < len(values):
-                value = values[i].strip()
-                # Handle empty values
-                if value == '' or value.lower()== 'nan':
-                    value = None
-                data_dict[header.strip()]= value
-
-        return data_dict
+        return self.parse_csv_row(headers, values)
+
+    def parse_csv_row(self, headers: List[str], values: List[str]) -> Dict[str, Any]:
+        """Build the data dictionary of one already parsed CSV row"""
+        # Create data dictionary, empty values are stored as None
+        stripped = [value.strip() for value in values]
+        return {
+            header.strip(): (None if value == '' or value.lower() == 'nan' else value)
+            for header, value in zip(headers, stripped)
+        }
     
     def categorize_data(self, data_dict: Dict[str, Any]) -> Dict[str, Dict[str, Dict[str, Any]]]:
         """Organize data by categories"""
-        categorized = {}
+        categorized = defaultdict(dict)
 
         for field_name, value in data_dict.items():
-            if field_name in self.schema:
-                field_schema = self.schema[field_name]
-                category = field_schema.category
-
-                if category not in categorized:
-                    categorized[category]={}
-
-                categorized[category][field_name]= {
+            field_schema = self.schema.get(field_name)
+            if field_schema is not None:
+                categorized[field_schema.category][field_name]= {
                     'value': value,
                     'description': field_schema.description,
                     'is_multi_select': field_schema.is_multi_select
                 }
 
-        return categorized
+        return dict(categorized)
 
     def format_customer_data_section(self, csv_content: str, include_insights: bool = True) -> str:
         """Format customer data into readable sections"""
         # Parse CSV data
-        data_dict = self.parse_csv_data(csv_content)
+        return self.format_customer_data(self.parse_csv_data(csv_content), include_insights)
+
+    def format_customer_row(self, headers: List[str], values: List[str], include_insights: bool = True) -> str:
+        """Format one already parsed CSV row (e.g. from csv.reader) into readable sections"""
+        return self.format_customer_data(self.parse_csv_row(headers, values), include_insights)
 
+    def format_customer_data(self, data_dict: Dict[str, Any], include_insights: bool = True) -> str:
+        """Format a customer data dictionary into readable sections"""
         #Organize data by categories
         categorized_data = self.categorize_data(data_dict)
 
-        # Build output
-        sections = ["Customer Data Analysis:\n"]
+        # Build output, every line after the heading is written with its leading line break
+        buf = io.StringIO()
+        write = buf.write
+        write("Customer Data Analysis:\n")
 
         # Output categories in predefined order
-        category_order = ['基礎信息','互動與偏好','財務數據','交易行爲','風險評估']
-                          
-        for category in category_order:
-            if category in categorized_data:
+        for category in self._category_order:
+            fields = categorized_data.get(category)
+            if fields:
                 # Add category title(Chinese-English)
-                english_category = self.categories.get(category, category)
-                sections.append(f"\n{category}({english_category}):")
+                english_category = self.categories[category]
+                write(f"\n\n{category}({english_category}):")
 
                 # Add field information
-                for field_name, field_info in categorized_data[category].items():
+                for field_name, field_info in fields.items():
                     value = field_info['value']
                     description = field_info['description']
 
@@ -139,38 +154,29 @@ class SchemaParser:
                     formatted_value = self._format_value(field_name, value)
 
                     # Build line
-                    line = f"- {field_name} ({description}): {formatted_value}"
-                    sections.append(line)
+                    write(f"\n- {field_name} ({description}): {formatted_value}")
 
         # Add key insights
         if include_insights:
             insights = self._generate_key_insights(data_dict)
-            sections.append("\n\nKEY INSIGHTS TO CONSIDER:")
+            write("\n\n\nKEY INSIGHTS TO CONSIDER:")
             for i,insight in enumerate(insights,1):
-                sections.append(f"{i}. {insight}")
+                write(f"\n{i}. {insight}")
 
-        return '\n'.join(sections)
+        return buf.getvalue()
     
     def _format_value(self,field_name: str,value: Any)-> str:
         """Format field value display"""
         if value is None:
             return "N/A"
-        
-        # Value mappings for special fields
-        value_mappings = {
-            'Y':'是(Yes)',
-            'N':'否(No)',
-            'Male':'男性',
-            'Female':'女性',
-            'Single':'單身',
-            'Married':'已婚'
-        }
 
         # Use mapping if value exists in mappings
-        if str(value) in value_mappings:
-            return f"{value}({value_mappings[str(value)]})"
-        
-        return str(value)
+        str_value = str(value)
+        mapped = _VALUE_MAPPINGS.get(str_value)
+        if mapped:
+            return f"{str_value}({mapped})"
+
+        return str_value
     
     def _generate_key_insights(self, data_dict: Dict[str, Any])-> List[str]:
         """Generate key insights based on customer data"""
@@ -1,19 +1,20 @@
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field  # 用于定义 Tool 的输入参数
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 from config_parser import get_config
 
-config = get_config()
-cfg = config.get_config()
-
-api_key = cfg.doubao_api_key
-api_endpoint = cfg.doubao_api_endpoint
+# 复用同一个连接池，重复调用时不必重新进行 TCP/TLS 握手
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5)))
 
 def test_run(query: str) -> str:  # 从参数接收query，而不是类属性
         """Tool 的核心执行逻辑：调用豆包 API 并返回结果"""
         try:
-            # 获取API密钥和端点
+            # 获取API密钥和端点（在调用时才读取配置，导入本模块不读取文件）
+            cfg = get_config().get_config()
             api_key = cfg.doubao_api_key
             api_endpoint = cfg.doubao_api_endpoint
 
@@ -35,7 +36,7 @@ def test_run(query: str) -> str:  # 从参数接收query，而不是类属性
             }
 
             # 发送请求
-            response = requests.post(
+            response = _SESSION.post(
                 url=api_endpoint,
                 headers=headers,
                 json=payload
@@ -56,5 +57,6 @@ def test_run(query: str) -> str:  # 从参数接收query，而不是类属性
             return f"调用工具时发生未知错误：{str(e)}"
         
 
-result = test_run("解释 CrewAI 的核心概念")
-print(result)
\ No newline at end of file
+if __name__ == "__main__":
+    result = test_run("解释 CrewAI 的核心概念")
+    print(result)
\ No newline at end of file